@@ -28,16 +28,41 @@
 # TODO:  stash things like signal strength and network name in Redis
 
 import argparse
+import ctypes
+import ctypes.util
+import functools
+import logging
 import os
+import socket
 import subprocess
 import re
 
 from common.rediswrapper import RedisWrapper
-from telit import Telit, check_for_telit
+from telit import Modem, check_for_telit
 
 Clock_flag = "/tmp/telit_clock"
 verbose = False
 
+_REV_RE = re.compile(r"^Revision\s*:\s*([0-9a-fA-F]+)$", re.M)
+_SER_RE = re.compile(r"^Serial\s*:\s*([0-9a-fA-F]+)$", re.M)
+_RECEIVED_RE = re.compile(rb" ([0-9]+) received, ")
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+def _clock_settime(utc):
+    """set CLOCK_REALTIME directly, returns 0 or the errno from clock_settime()"""
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    seconds = utc.timestamp()
+    ts = _Timespec(int(seconds), int((seconds % 1) * 1e9))
+
+    if libc.clock_settime(0, ctypes.byref(ts)) != 0:
+        return ctypes.get_errno()
+
+    return 0
+
 
 def set_clock(t, check=None):
     """
@@ -46,7 +71,8 @@ def set_clock(t, check=None):
     t -- is Telit instance
     check -- None or pathname to touch when we set the clock so we set it exactly once
 
-    use date to set the time because chrony is not yet running
+    set the time directly because chrony is not yet running, falls back to sudo date
+    if we aren't allowed to
 
     this will give you time sync but not great time sync
     """
@@ -60,24 +86,38 @@ def set_clock(t, check=None):
     if verbose:
         print(f"[ecm] Setting time to {utc_str}")
 
-    rc = subprocess.run(["sudo", "date", "--utc", utc_str], capture_output=True, text=True)
+    err = _clock_settime(utc)
 
-    if verbose:
-        print(f"[ecm] Output from date:\n{rc.stdout}\n{rc.stderr}")
+    if err != 0:
+        if verbose:
+            print(f"[ecm] clock_settime failed ({os.strerror(err)}), using date")
+
+        rc = subprocess.run(["sudo", "date", "--utc", utc_str], capture_output=True, text=True)
+
+        if verbose:
+            print(f"[ecm] Output from date:\n{rc.stdout}\n{rc.stderr}")
 
     if check is not None:
-        with open(check, "w") as f:
-            pass
+        os.close(os.open(check, os.O_CREAT | os.O_WRONLY, 0o644))
 
 
-def find_pi_id():
+def _read_device_tree(name):
+    """read a null-terminated string from /proc/device-tree, None if it isn't there"""
+    try:
+        with open(f"/proc/device-tree/{name}", "r") as f:
+            return f.read().rstrip("\x00")
+    except OSError:
+        return None
+
+
+def _parse_pi_id():
     """
-        find raspberry pi id in /proc/cpuinfo
+        find raspberry pi id in /proc/cpuinfo, or /proc/device-tree if cpuinfo has no Serial
 
         returns (str):
             pi:dddddddddddddddddddd (raspberry pi 3 and earlier)
             pi4:dddddddddddddddddddd (raspberry pi 4 &c)
-            None (no Serial # found in /proc/cpuinfo
+            None (no Serial # found in /proc/cpuinfo or /proc/device-tree)
 
         type determination from
             https://www.raspberrypi.org/documentation/hardware/raspberrypi/revision-codes/README.md
@@ -86,47 +126,85 @@ def find_pi_id():
     """
 
     with open("/proc/cpuinfo", "r") as f:
-        lines = f.readlines()
+        data = f.read()
 
     serial = None
     revision = None
 
-    for w in lines:
-        if len(w) > 8 and w[:8] == "Revision":
-            words = w.split(':')
-            if len(words) == 2:
-                revision = int(words[1], base=16)
+    m = _REV_RE.search(data)
+    if m is not None:
+        revision = int(m[1], base=16)
 
-        if len(w) > 6 and w[:6] == "Serial":
-            words = w.split(':')
-            if len(words) == 2:
-                serial = int(words[1], base=16)
+    m = _SER_RE.search(data)
+    if m is not None:
+        serial = int(m[1], base=16)
+
+    model = None
 
     if serial is None:
-        return None
+        try:
+            serial = int(_read_device_tree("serial-number"), base=16)
+        except (TypeError, ValueError):
+            return None
 
-    if revision is None:
-        rc = f"pi:{serial}"
-    else:
+        model = _read_device_tree("model")
+
+    if revision is not None:
         pi_type = (revision & 0b0111111110000) >> 4
+        is_pi4 = pi_type >= 11
+    else:
+        is_pi4 = model is not None and ("Raspberry Pi 4" in model or "Raspberry Pi 5" in model)
 
-        if pi_type >= 11:
-            rc = f"pi4:{serial}"
-        else:
-            rc = f"pi:{serial}"
+    if is_pi4:
+        return f"pi4:{serial}"
 
-    return rc
+    return f"pi:{serial}"
 
 
-def check_connection(host):
-    cmd = ["ping", "-i", "0.4", "-c", "5", host]
+@functools.lru_cache(maxsize=1)
+def find_pi_id():
+    """
+        returns the raspberry pi id (see _parse_pi_id())
+
+        the id never changes while we are running so it is only worked out from /proc once
+    """
+    return _parse_pi_id()
+
+
+def _can_connect(host, port=443, timeout=1.0):
+    """
+    returns truthy if we can reach host with a tcp connection
+
+    a refused connection still means the network is up, we only care that something answered
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            pass
+
+    except ConnectionRefusedError:
+        pass
+
+    except OSError:
+        return False
+
+    return True
+
 
+def check_connection(host):
     if verbose:
         print(f"[ecm] Checking ECM connection to {host}")
 
-    output = subprocess.run(cmd, capture_output=True, text=True).stdout
+    if _can_connect(host):
+        if verbose:
+            print(f"[ecm] {host} answered")
+
+        return True
+
+    # fall back on ping in case host just doesn't talk tcp
+    cmd = ["ping", "-i", "0.4", "-c", "5", host]
+    output = subprocess.run(cmd, capture_output=True).stdout
 
-    m = re.search(r' ([0-9]+) received, ', output)
+    m = _RECEIVED_RE.search(output)
 
     if m is not None:
         if verbose:
@@ -149,6 +227,7 @@ def main():
     ap.add_argument("--setclock", required=False, default=False, action='store_true')
 
     args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="[%(name)s] %(message)s")
 
     verbose = args.verbose
 
@@ -161,6 +240,7 @@ def main():
         exit(1)
 
     R = RedisWrapper()
+    has_telit = check_for_telit()
 
     if args.start:
         pi_id = find_pi_id()
@@ -169,16 +249,16 @@ def main():
         if verbose:
             print(f"[ecm] pi_id is {pi_id}")
 
-        if not check_for_telit():
+        if not has_telit:
             R["ID"] = pi_id
 
-    if not check_for_telit():
+    if not has_telit:
         if verbose:
             print(f"[ecm] no telit card, exiting")
 
         exit(0)
 
-    with Telit("/dev/ttyUSB2", verbose=verbose) as t:
+    with Modem("/dev/ttyUSB2", verbose=verbose) as t:
         if args.start:
             t.send_at_ok()
 
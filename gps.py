@@ -13,44 +13,118 @@
 import argparse
 import time
 import os
-import math
 import json
+import logging
+import operator
+import queue
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from common.rediswrapper import RedisWrapper
-from telit import Telit, check_for_telit
+from telit import Modem, check_for_telit
 
-R = RedisWrapper()
+_R = None
 Location_src = "/boot/deepseek/location.json"
 Location_tmp = "/tmp/deepseek/location.json"
+_current = None
+_best_hdop = float("inf")
+_redis_hdop = float("inf")
+
+_KEYS = ("latitude", "longitude", "altitude", "hdop")
+_GET = operator.itemgetter(*_KEYS)
+
+
+def R():
+    """RedisWrapper instance, only connects the first time it is needed"""
+    global _R
+
+    if _R is None:
+        _R = RedisWrapper()
+
+    return _R
 
 
 def coord_within_tolerance(coord1, coord2):
-    """see if coord1 and coord2 are equal within tolerances (four decimal places)"""
-    r_lat = math.isclose(coord1["latitude"], coord2["latitude"], rel_tol=1e-9, abs_tol=1e-4)
-    r_lon = math.isclose(coord1["longitude"], coord2["longitude"], rel_tol=1e-9, abs_tol=1e-4)
+    """see if coord1 and coord2 are within 1e-4 degrees of each other (four decimal places)"""
+    d_lat = coord1["latitude"] - coord2["latitude"]
+    d_lon = coord1["longitude"] - coord2["longitude"]
 
-    return r_lat and r_lon
+    return d_lat * d_lat + d_lon * d_lon <= 1e-8
 
 
 def set_coordinates(pos, verbose):
     """note coordinates found to REDIS"""
-    global R
+    global _redis_hdop
 
     if pos is None:
         return
 
-    if R["HDOP"] is not None and pos["hdop"] > R["HDOP"]:
+    # no need to ask Redis when it already holds a better fix that we wrote ourselves
+    if pos["hdop"] > _redis_hdop:
         return
 
-    R["LATITUDE"] = round(pos["latitude"], 4)
-    R["LONGITUDE"] = round(pos["longitude"], 4)
-    R["ALTITUDE"] = pos["altitude"]
-    R["HDOP"] = pos["hdop"]
+    r = R()
+    current = r["HDOP"]
+
+    if current is not None and pos["hdop"] > current:
+        return
+
+    r["LATITUDE"] = round(pos["latitude"], 4)
+    r["LONGITUDE"] = round(pos["longitude"], 4)
+    r["ALTITUDE"] = pos["altitude"]
+    r["HDOP"] = pos["hdop"]
+    _redis_hdop = pos["hdop"]
 
     if verbose:
         print(f"[gps] GPS fix:  {pos['latitude']:.4f}, {pos['longitude']:.4f}")
 
 
+def _load_json(path):
+    """read a json file, with orjson if we have it"""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _dump_json(value, path):
+    """write value to a json file, with orjson if we have it"""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(value))
+        return
+
+    with open(path, "w") as f:
+        json.dump(value, f)
+
+
+def _read_current():
+    """contents of Location_tmp, only read from disk the first time"""
+    global _current
+
+    if _current is None and os.path.exists(Location_tmp):
+        _current = _load_json(Location_tmp)
+
+    return _current
+
+
+def _write_current(value):
+    """atomically replace Location_tmp with value"""
+    global _current, _best_hdop
+
+    tmp = f"{Location_tmp}.tmp"
+    _dump_json(value, tmp)
+    os.replace(tmp, Location_tmp)
+    _current = value
+    _best_hdop = value["hdop"]
+
+
 def update_coordinates(pos, verbose, force=False):
     """
     update /tmp/deepseek/location.json if necessary
@@ -61,25 +135,26 @@ def update_coordinates(pos, verbose, force=False):
     if pos is None:
         return
 
-    value = {k: pos[k] for k in ["latitude", "longitude", "altitude", "hdop"]}
+    # cheap check against the best fix we've written before going anywhere near the file
+    if not force and pos["hdop"] >= _best_hdop:
+        return
+
+    value = dict(zip(_KEYS, _GET(pos)))
 
     value["latitude"] = round(value["latitude"], 4)
     value["longitude"] = round(value["longitude"], 4)
 
     if not force:
-        if os.path.exists(Location_tmp):
-            with open(Location_tmp, "r") as f:
-                current = json.load(f)
+        current = _read_current()
 
-            if value["hdop"] >= current["hdop"]:
-                return
+        if current is not None and value["hdop"] >= current["hdop"]:
+            return
 
     if verbose:
         print(
             f"[gps] updating gps coordinates to {Location_tmp} ({value['latitude']:.4f},{value['longitude']:.4f})")
 
-    with open(Location_tmp, "w") as f:
-        json.dump(value, f)
+    _write_current(value)
 
 
 def initialize_coordinates(verbose):
@@ -87,8 +162,7 @@ def initialize_coordinates(verbose):
     if not os.path.exists(Location_src):
         return
 
-    with open(Location_src, "r") as f:
-        loc = json.load(f)
+    loc = _load_json(Location_src)
 
     # sleazy hack
     # this lets us update with better coordinates or if we have changed the location of the camera
@@ -110,20 +184,55 @@ def get_gps_fix(t, verbose, retries):
     update_coordinates(pos, verbose)
 
 
+def _position_reader(t, until, q):
+    """
+    background thread that talks to the modem and hands positions (or None) to q
+
+    quits once it finds a position with an hdop of "until" or better, any exception is
+    handed to q as well so the main thread can raise it
+    """
+    delay = 1.0
+
+    try:
+        while True:
+            pos = t.get_position(until, total=12)
+            q.put(pos)
+
+            if pos is None:
+                time.sleep(delay)
+                delay = min(delay * 2, 15.0)
+            elif pos["hdop"] <= until:
+                return
+            else:
+                delay = 1.0
+
+    except Exception as e:
+        q.put(e)
+
+
 def get_continuous_gps_fix(t, verbose, until):
-    """get a gps fix until the hdop value is below "until" """
+    """
+    get a gps fix until the hdop value is below "until"
+
+    the modem is read from a background thread so saving a fix overlaps waiting on the next one
+    """
     last_pos = None
     counter = 1
 
+    q = queue.Queue()
+    reader = threading.Thread(target=_position_reader, args=(t, until, q), daemon=True)
+    reader.start()
+
     while True:
-        pos = t.get_position(until, total=12)
+        pos = q.get()
+
+        if isinstance(pos, Exception):
+            raise pos
 
         if pos is None:
             if verbose:
                 print(f"[gps] No GPS fix #{counter}")
                 counter += 1
-
-            time.sleep(10)
         elif last_pos is None or pos["hdop"] < last_pos["hdop"]:
             last_pos = pos
             set_coordinates(last_pos, verbose)
@@ -133,6 +242,7 @@ def get_continuous_gps_fix(t, verbose, until):
                 if verbose:
                     print(f"[gps] Got GPS fix ({pos['hdop']:.3f})")
 
+                reader.join()
                 return
 
 
@@ -146,6 +256,7 @@ def main():
     ap.add_argument("--until", default=None, type=float, required=False)
 
     args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="[%(name)s] %(message)s")
 
     if not check_for_telit():
         print(f"[gps] No telit card, exiting")
@@ -156,7 +267,7 @@ def main():
         if args.initonly:
             exit(0)
 
-    with Telit("/dev/ttyUSB3", args.verbose) as t:
+    with Modem("/dev/ttyUSB3", args.verbose) as t:
         t.send_at_ok()
 
         if t.get_gpsp_status() == 0:
@@ -17,6 +17,7 @@
 # Copyright (C) 2020 Deepseek Labs, Inc.
 
 import argparse
+import logging
 import time
 import os
 
@@ -42,6 +43,7 @@ def main():
     ap.add_argument("--count", required=False, type=int, default=1)
 
     args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="[%(name)s] %(message)s")
     verbose = args.verbose
 
     if not check_device(args.device):
@@ -49,8 +51,6 @@ def main():
         exit(1)
 
     with Telit(args.device, verbose=args.verbose) as t:
-        time.sleep(0.5)
-
         try:
             t.send_at_ok()
 
@@ -60,12 +60,13 @@ def main():
             if t.get_gpsp_status() == 0:
                 _ = t.send_gpsp_on()
 
-            for k in range(args.count):
-                if k > 0:
-                    time.sleep(15)
+            delay = 1.0
 
+            for k in range(args.count):
                 x = t.get_position(args.hdop)
                 if x is not None:
+                    delay = 1.0
+
                     if verbose:
                         print(f"[telit] ***RESULTS***: {x['latitude']:.3f},{x['longitude']:.3f}")
                     else:
@@ -73,6 +74,10 @@ def main():
                 else:
                     print(f"[telit] nowhere")
 
+                    if k < args.count - 1:
+                        time.sleep(delay)
+                        delay = min(delay * 2, 15.0)
+
             time.sleep(0.1)
 
             _ = t.send_gpsp_off()
@@ -13,28 +13,55 @@ Class interface for the Telit LE910C4 cellular module
         ...
 
     Recommended to always use send_at_ok() as the first thing you do with it
+
+    TelitFast has the same interface but opens the tty directly instead of going through cu,
+    Modem is whichever of the two the TELIT_FAST environment variable picks
 """
 
 # Copyright (C) 2021 Deepseek Labs, Inc.
 
 
+import os
+import re
 import time
 import datetime
+import fcntl
+import functools
+import selectors
+import termios
+import glob
+import logging
 import pexpect
-import subprocess
 
 # TODO:  consider using an @retry decorator to handle the retries rather than with explicit loops
 # TODO:  a lot of duplicated code could be refactored
 # TODO:  Get network provider name
 # TODO:  more info in __str__()
 
+log = logging.getLogger("telit")
+
+
+# lsusb's "Telit Wireless Solutions" is just its name for this vendor id
+Telit_vendor = "1bc7"
+
+
+def _read_sysfs(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+
+    except OSError:
+        return ""
+
 
 def check_for_telit():
-    """checks for presence of telit module"""
-    output = subprocess.run(["lsusb"], capture_output=True, text=True).stdout
+    """checks for presence of telit module by looking at the usb devices in sysfs"""
+    for dev in glob.glob("/sys/bus/usb/devices/*"):
+        if _read_sysfs(os.path.join(dev, "idVendor")) == Telit_vendor:
+            return True
 
-    if "Telit Wireless Solutions" in output:
-        return True
+        if "Telit" in _read_sysfs(os.path.join(dev, "manufacturer")):
+            return True
 
     return False
 
@@ -63,12 +90,255 @@ class TelitDataError(ModemError):
     pass
 
 
+_DIR_SIGN = {"N": 1, "S": -1, "E": 1, "W": -1}
+
+
+def _strip_quotes(buf):
+    # strip quotes out from buf
+    if len(buf) < 2:
+        return buf
+
+    if buf[0] == '"' and buf[-1] == '"':
+        return buf[1:-1]
+
+    return buf
+
+
+def _coordinate(degrees, minutes, direction):
+    """produce normal signed fractional degrees from weird gps value"""
+    try:
+        sign = _DIR_SIGN[direction]
+    except KeyError:
+        raise TelitGPSDataError(f"bad direction '{direction}'")
+
+    return sign * (int(degrees) + float(minutes) / 60)
+
+
+def _parse_values(m):
+    """break out values from a GPS sentence matched by TelitGPS._POSITION_RE"""
+    return dict(
+        GMTIME=m["GMTIME"],
+        LATITUDE=m["LATITUDE"],
+        LONGITUDE=m["LONGITUDE"],
+        HDOP=m["HDOP"],
+        ALTITUDE=m["ALTITUDE"],
+        fix=m["fix"],
+        COG=m["COG"],
+        SPKM=m["SPKM"],
+        SPKN=m["SPKN"],
+        DATE=m["DATE"],
+        NSAT_GPS=m["NSAT_GPS"],
+        NSAT_GLONASS=m["NSAT_GLONASS"],
+        latitude=_coordinate(m["lat_deg"], m["lat_min"], m["lat_dir"]),
+        longitude=_coordinate(m["lon_deg"], m["lon_min"], m["lon_dir"]),
+        altitude=float(m["ALTITUDE"]),
+        hdop=float(m["HDOP"]),
+    )
+
+
+def _parse_gga(sentence):
+    """break out values from a GGA sentence (less the $GPGGA, prefix), None if there is no fix"""
+    fields = sentence.split(',')
+
+    if len(fields) < 9 or fields[5] in ("", "0") or fields[7] == "" or fields[8] == "":
+        return None
+
+    rc = dict(
+        GMTIME=fields[0],
+        LATITUDE=fields[1] + fields[2],
+        LONGITUDE=fields[3] + fields[4],
+        fix=fields[5],
+        NSAT=fields[6],
+        HDOP=fields[7],
+        ALTITUDE=fields[8],
+    )
+
+    rc["latitude"] = _coordinate(fields[1][:2], fields[1][2:], fields[2])
+    rc["longitude"] = _coordinate(fields[3][:3], fields[3][3:], fields[4])
+    rc["altitude"] = float(rc["ALTITUDE"])
+    rc["hdop"] = float(rc["HDOP"])
+
+    return rc
+
+
+class SerialChild:
+    """
+    talks to the modem tty directly in raw mode rather than through cu
+
+    implements just enough of the pexpect child interface (send, sendline, expect, match, before)
+    for ModemBase.  incoming bytes go into a bytearray that is searched once per read rather than
+    once per byte, and reads block on a selector (epoll on linux) until data shows up or the
+    timeout expires
+    """
+    def __init__(self, device, bps=115200):
+        self._device = device
+        self._buffer = bytearray()
+        self.match = None
+        self.before = b""
+        self.after = b""
+
+        # O_NONBLOCK so the open doesn't hang waiting on carrier, then back to blocking writes
+        self._fd = os.open(device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        flags = fcntl.fcntl(self._fd, fcntl.F_GETFL)
+        fcntl.fcntl(self._fd, fcntl.F_SETFL, flags & ~os.O_NONBLOCK)
+
+        attrs = termios.tcgetattr(self._fd)
+        attrs[0] = 0
+        attrs[1] = 0
+        attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL
+        attrs[3] = 0
+        attrs[4] = attrs[5] = getattr(termios, f"B{bps}")
+        attrs[6][termios.VMIN] = 0
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+        termios.tcflush(self._fd, termios.TCIOFLUSH)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._fd, selectors.EVENT_READ)
+
+    def __str__(self):
+        return f"{type(self)}({self._device}, buffer is {bytes(self._buffer)})"
+
+    def close(self):
+        if self._fd is not None:
+            self._selector.close()
+            os.close(self._fd)
+            self._fd = None
+
+    def send(self, s):
+        if isinstance(s, str):
+            s = s.encode('utf-8')
+
+        if self._fd is None:
+            raise pexpect.EOF(f"{self._device} is closed")
+
+        try:
+            os.write(self._fd, s)
+        except OSError as e:
+            # EIO once the modem drops off the usb bus, same as _read()
+            raise pexpect.EOF(f"error writing {self._device}: {e}")
+
+        return len(s)
+
+    def sendline(self, s=""):
+        return self.send(f"{s}\r")
+
+    def _read(self, timeout):
+        """wait up to timeout for more data, returns False on EOF"""
+        if not self._selector.select(timeout):
+            return True
+
+        try:
+            data = os.read(self._fd, 4096)
+        except OSError:
+            # EIO when the modem drops off the usb bus, e.g. rebooting
+            return False
+
+        self._buffer += data
+        return len(data) > 0
+
+    def _search(self, patterns):
+        """earliest hit in the buffer as (index, start, end, match) or None, bytes patterns are literals"""
+        data = bytes(self._buffer)
+        best = None
+
+        for i, p in enumerate(patterns):
+            if p is None:
+                continue
+
+            if isinstance(p, bytes):
+                start = data.find(p)
+
+                if start < 0:
+                    continue
+
+                found = (i, start, start + len(p), p)
+            else:
+                m = p.search(data)
+
+                if m is None:
+                    continue
+
+                found = (i, m.start(), m.end(), m)
+
+            if best is None or found[1] < best[1]:
+                best = found
+
+        return best
+
+    def _expect(self, patterns, searchers, timeout):
+        """wait for the first of searchers to show up in the buffer, returns its index"""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            found = self._search(searchers)
+
+            if found is not None:
+                i, start, end, self.match = found
+                self.before = bytes(self._buffer[:start])
+                self.after = bytes(self._buffer[start:end])
+                del self._buffer[:end]
+                return i
+
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                if pexpect.TIMEOUT in patterns:
+                    return patterns.index(pexpect.TIMEOUT)
+
+                raise pexpect.TIMEOUT(f"timed out reading {self._device}")
+
+            if not self._read(remaining):
+                if pexpect.EOF in patterns:
+                    return patterns.index(pexpect.EOF)
+
+                raise pexpect.EOF(f"end of file reading {self._device}")
+
+    def expect(self, patterns, timeout=30):
+        """like pexpect's expect(), patterns can include pexpect.TIMEOUT and pexpect.EOF"""
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+
+        searchers = []
+
+        for p in patterns:
+            if p is pexpect.TIMEOUT or p is pexpect.EOF:
+                searchers.append(None)
+            elif isinstance(p, str):
+                searchers.append(re.compile(p.encode('utf-8')))
+            elif isinstance(p, bytes):
+                searchers.append(re.compile(p))
+            else:
+                searchers.append(p)
+
+        return self._expect(patterns, searchers, timeout)
+
+    def expect_exact(self, patterns, timeout=30):
+        """like pexpect's expect_exact(), plain substring search with no regex"""
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+
+        searchers = []
+
+        for p in patterns:
+            if p is pexpect.TIMEOUT or p is pexpect.EOF:
+                searchers.append(None)
+            elif isinstance(p, str):
+                searchers.append(p.encode('utf-8'))
+            else:
+                searchers.append(p)
+
+        return self._expect(patterns, searchers, timeout)
+
+
 class ModemBase:
     """
     base class to handle opening the communications channel and resource grabbing protocol
     supports context managers and manages pexpect child process and also has helper code to wait for
     modem results and do initial command-finding (by repeated sending 'AT' commands)
     """
+    _RESULTS = [pexpect.TIMEOUT, b"OK\r\n", b"ERROR\r\n"]
+
     def __init__(self, device, timeout=10, verbose=False, bps=115200):
         self._device = device
         self._timeout = timeout
@@ -80,8 +350,15 @@ class ModemBase:
     def __str__(self):
         return f"{type(self)}({self._device}, verbose is {self._verbose})"
 
+    def _spawn(self):
+        child = pexpect.spawn(self._cmd)
+
+        # pexpect sleeps 50ms before every send by default, the modem doesn't need it
+        child.delaybeforesend = None
+        return child
+
     def _start_cu(self):
-        self._child = pexpect.spawn(self._cmd)
+        self._child = self._spawn()
         return self
 
     def __enter__(self):
@@ -89,9 +366,10 @@ class ModemBase:
 
     def __exit__(self, exc_type, exc_value, traceback):
         self._child.sendline("")
-        time.sleep(0.1)
         self._child.sendline("~.")
-        time.sleep(0.5)
+
+        # wait for cu to actually hang up rather than a fixed half second
+        self._child.expect([pexpect.EOF, pexpect.TIMEOUT], timeout=2)
 
     @property
     def child(self):
@@ -100,15 +378,13 @@ class ModemBase:
     def _handle_single_result(self, i):
         """this function handles a single result and returns it as a str"""
         if i == 0:
-            if self._verbose:
-                print(f"[telit] Timeout, failing!")
+            log.debug("Timeout, failing!")
 
             raise ModemTimeout
         elif i == 1:
             rc = self._child.match[1].decode('utf-8')
 
-            if self._verbose:
-                print(f"[telit] results:  '{rc}'")
+            log.debug("results:  '%s'", rc)
 
             return rc
 
@@ -116,21 +392,18 @@ class ModemBase:
 
     def _wait_for_result(self):
         """wait for OK, ERROR, or timeout return "OK" or raise an exception"""
-        i = self._child.expect([pexpect.TIMEOUT, "OK\r\n", "ERROR\r\n"], timeout=self._timeout)
+        i = self._child.expect_exact(self._RESULTS, timeout=self._timeout)
 
         if i == 0:
-            if self._verbose:
-                print(f"[telit] Timed out!")
+            log.debug("Timed out!")
 
             raise ModemTimeout
         elif i == 1:
-            if self._verbose:
-                print(f"[telit] Saw OK")
+            log.debug("Saw OK")
 
             return "OK"
         elif i == 2:
-            if self._verbose:
-                print(f"[telit] Saw ERROR")
+            log.debug("Saw ERROR")
 
             raise ModemError
 
@@ -139,11 +412,9 @@ class ModemBase:
     def send_at_ok(self, count=10):
         """repeatedly send 'AT' command until we get OK or give up"""
         self._child.send("\r")
-        time.sleep(0.1)
 
         for k in range(count):
-            if self._verbose:
-                print(f"[telit] Trying to send 'AT', try #{k + 1}")
+            log.debug("Trying to send 'AT', try #%s", k + 1)
 
             self._child.send("AT\r")
 
@@ -151,28 +422,17 @@ class ModemBase:
                 _ = self._wait_for_result()
 
             except ModemTimeout:
-                time.sleep(0.5)
+                # back off quickly so a modem that is nearly ready doesn't cost us much
+                time.sleep(min(0.1 * 2 ** k, 2.0))
 
             else:
                 return
 
         raise ModemTimeout
 
-    @classmethod
-    def _strip_quotes(cls, buf):
-        # strip quotes out from buf
-        if len(buf) < 2:
-            return buf
-
-        if buf[0] == '"' and buf[-1] == '"':
-            return buf[1:-1]
-
-        return buf
-
     def _command_with_result(self, description, command, pattern):
         """send a command and wait for a result pattern and OK"""
-        if self._verbose:
-            print(f"[telit] {description} {command}")
+        log.debug("%s %s", description, command)
 
         self._child.send(f"{command}\r")
 
@@ -182,17 +442,43 @@ class ModemBase:
 
         return rc
 
+    def _command_batch(self, description, commands):
+        """
+        send several commands on one line and wait for the single OK at the end
+
+        commands are given without the leading AT, e.g. ['$GPSP=1', '$GPSNMUN=1,1,0,1,0,0,0']
+        the modem runs them in order and stops at the first one that fails
+        """
+        line = "AT" + ";".join(commands)
+
+        log.debug("%s %s", description, line)
+
+        self._child.send(f"{line}\r")
+        return self._wait_for_result()
+
 
 class TelitGPS(ModemBase):
     """
     Telit GPS modem interface.  Right now only GPS functions
     """
+    _GPSP_RE = re.compile(rb"[$]GPSP:[ ]+([0-9])\r\n")
+    _GPSACP_RE = re.compile(rb"[$]GPSACP:[ ]+([-0-9A-Z,.]+)\r\n")
+    _POSITION_RE = re.compile(
+        r"^(?P<GMTIME>\d{6}\.\d+),"
+        r"(?P<LATITUDE>(?P<lat_deg>\d{2})(?P<lat_min>\d{2}\.\d+)(?P<lat_dir>[NS])),"
+        r"(?P<LONGITUDE>(?P<lon_deg>\d{3})(?P<lon_min>\d{2}\.\d+)(?P<lon_dir>[EW])),"
+        r"(?P<HDOP>[0-9.]+),(?P<ALTITUDE>-?[0-9.]+),(?P<fix>[0-3]),"
+        r"(?P<COG>[0-9.]*),(?P<SPKM>[0-9.]*),(?P<SPKN>[0-9.]*),(?P<DATE>\d{6}),"
+        r"(?P<NSAT_GPS>\d*),(?P<NSAT_GLONASS>\d*)$")
+    _GGA_RE = re.compile(rb"[$]G[PN]GGA,([^*\r]*)[*]?[0-9A-F]*\r\n")
+    _GSA_RE = re.compile(rb"[$]G[A-Z]GSA,[AM],([1-3]),[^\r]*\r\n")
+
     def __init__(self, device, verbose=False, timeout=10):
         super().__init__(device, timeout=timeout, verbose=verbose)
 
     def get_gpsp_status(self):
         """get the current state of the gps (in case it is on)"""
-        rc = self._command_with_result("Getting GPS power state with", "AT$GPSP?", r"[$]GPSP:[ ]+([0-9])\r\n")
+        rc = self._command_with_result("Getting GPS power state with", "AT$GPSP?", self._GPSP_RE)
         return int(rc)
 
     def send_gpsp(self, state):
@@ -204,76 +490,20 @@ class TelitGPS(ModemBase):
 
     def send_gpsp_on(self):
         """turn on gps"""
-        if self._verbose:
-            print(f"[telit] Sending AT$GPSP=1 to power on GPS")
+        log.debug("Sending AT$GPSP=1 to power on GPS")
 
         return self.send_gpsp(1)
 
     def send_gpsp_off(self):
         """turn off gps"""
-        if self._verbose:
-            print(f"[telit] Sending AT$GPSP=0 to power off GPS")
+        log.debug("Sending AT$GPSP=0 to power off GPS")
 
         return self.send_gpsp(0)
 
     def _get_one_position(self):
         """get position, matched string or None"""
         return self._command_with_result(
-            "Getting current position with", "AT$GPSACP", r"[$]GPSACP:[ ]+([0-9A-Z,.]+)\r\n")
-
-    @classmethod
-    def _parse_latitude(cls, lat):
-        """produce normal signed fractional latitude from weird gps value"""
-        direction = lat[-1:]
-        sign = 0
-
-        if direction == "N":
-            sign = 1
-        elif direction == "S":
-            sign = -1
-
-        return sign * (float(int(lat[:2])) + float(lat[2:-1]) / 60)
-
-    @classmethod
-    def _parse_longitude(cls, lon):
-        """produce normal signed fractional longitude from weird gps value"""
-        direction = lon[-1:]
-        sign = 0
-
-        if direction == "E":
-            sign = 1
-        elif direction == "W":
-            sign = -1
-
-        return sign * (float(int(lon[:3])) + float(lon[3:-1]) / 60)
-
-    @classmethod
-    def _parse_values(cls, position):
-        """break out values from GPS sentence"""
-        if len(position) != 12:
-            raise TelitGPSDataError
-
-        rc = dict(
-            GMTIME=position[0],
-            LATITUDE=position[1],
-            LONGITUDE=position[2],
-            HDOP=position[3],
-            ALTITUDE=position[4],
-            fix=position[5],
-            COG=position[6],
-            SPKM=position[7],
-            SPKN=position[8],
-            DATE=position[9],
-            NSAT_GPS=position[10],
-            NSAT_GLONASS=position[11],
-        )
-
-        rc["latitude"] = Telit._parse_latitude(rc["LATITUDE"])
-        rc["longitude"] = Telit._parse_longitude(rc["LONGITUDE"])
-        rc["altitude"] = float(rc["ALTITUDE"])
-        rc["hdop"] = float(rc["HDOP"])
-
-        return rc
+            "Getting current position with", "AT$GPSACP", self._GPSACP_RE)
 
     def get_position(self, hdop, total=30):
         """
@@ -293,24 +523,102 @@ class TelitGPS(ModemBase):
                 time.sleep(0.1)
                 continue
 
-            position = results.split(',')
+            m = self._POSITION_RE.match(results)
 
-            if len(position) >= 6 and position[5] == '3':
-                rc = self._parse_values(position)
+            if m is not None and m["fix"] == '3':
+                rc = _parse_values(m)
                 if hdop >= rc["hdop"]:
                     return rc
                 else:
                     if min_results is None or min_results["hdop"] >= rc["hdop"]:
                         min_results = rc
 
-            if self._verbose:
-                print(f"[telit] get_position(): Try #{k+1}, got {position[5]}, hdop was '{position[3]}'")
-
-        if self._verbose:
-            if min_results is None:
-                print(f"[telit] Got nothing")
+            if m is None:
+                log.debug("get_position(): Try #%s, no fix in '%s'", k+1, results)
             else:
-                print(f"[telit] Best result had hdop {min_results['hdop']}")
+                log.debug("get_position(): Try #%s, got %s, hdop was '%s'", k+1, m['fix'], m['HDOP'])
+
+        if min_results is None:
+            log.debug("Got nothing")
+        else:
+            log.debug("Best result had hdop %s", min_results['hdop'])
+
+        return min_results
+
+    def enable_urc(self, power=False):
+        """
+            have the modem push out GGA and GSA sentences for every fix rather than waiting to be asked,
+            GGA has the position and GSA says whether the fix is 2D or 3D.
+            with power=True the GPS is powered on in the same exchange
+        """
+        commands = ["$GPSNMUN=1,1,0,1,0,0,0"]
+
+        if power:
+            commands.insert(0, "$GPSP=1")
+
+        self._command_batch("Turning on GGA and GSA sentences with", commands)
+
+    def disable_urc(self, power=False):
+        """stop the GGA and GSA sentences, with power=True the GPS is powered off in the same exchange"""
+        commands = ["$GPSNMUN=0"]
+
+        if power:
+            commands.append("$GPSP=0")
+
+        self._command_batch("Turning off GGA and GSA sentences with", commands)
+
+    def watch_position(self, hdop, seconds=60, power=False):
+        """
+            get gps position from the GGA sentences the modem pushes out, no polling
+            returns the first fix with an hdop less than or equal to the passed hdop, otherwise
+            the best fix seen in the allotted seconds (or None)
+
+            GGA can't tell a 2D fix from a 3D one, so like get_position() only 3D fixes count:
+            a GGA position is held until the GSA sentence that follows it in the same epoch
+            says the fix mode is 3, and dropped otherwise
+
+            power=True turns the GPS on for the watch and off again afterwards
+        """
+        min_results = None
+        pending = None
+        deadline = time.monotonic() + seconds
+
+        self.enable_urc(power)
+
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                i = self._child.expect([pexpect.TIMEOUT, self._GGA_RE, self._GSA_RE], timeout=remaining)
+
+                if i == 0:
+                    break
+                elif i == 1:
+                    pending = _parse_gga(self._child.match[1].decode('utf-8'))
+                    continue
+
+                # a GNSS receiver sends one GSA per constellation, only the first one settles the GGA
+                rc, pending = pending, None
+
+                if rc is None or self._child.match[1] != b"3":
+                    continue
+
+                if hdop >= rc["hdop"]:
+                    return rc
+
+                if min_results is None or min_results["hdop"] >= rc["hdop"]:
+                    min_results = rc
+
+        finally:
+            self.disable_urc(power)
+
+        if min_results is None:
+            log.debug("Got nothing")
+        else:
+            log.debug("Best result had hdop %s", min_results['hdop'])
 
         return min_results
 
@@ -320,86 +628,97 @@ class TelitECM(TelitGPS):
     Telit modem interface
     Has functions for ECM Mode and to set up ECM Mode
     """
+    _USBCFG_RE = re.compile(rb"[#]USBCFG:[ ]+([0-9]+)\r\n")
+    _CGDCONT_RE = re.compile(rb'[+]CGDCONT:[ ]+([0-9A-Za-z,"]+)\r\n')
+    _ECMC_RE = re.compile(rb'[#]ECMC:[ ]+([0-9A-Za-z,."]+)\r\n')
+
     def __init__(self, device, verbose=False, timeout=10):
         super().__init__(device, timeout=timeout, verbose=verbose)
+        self._usb_config = None
 
-    def _wait_for_reboot(self):
-        """wait a long time, then do AT resync """
-        if self._verbose:
-            print(f"[telit] Rebooting... expect a long pause")
+    def _start_cu(self):
+        # new session (or the modem rebooted), don't trust anything we remembered
+        self._usb_config = None
+        return super()._start_cu()
+
+    def _wait_for_device(self, timeout=60):
+        """wait for the tty to drop off the usb bus and come back"""
+        gone_by = time.monotonic() + 5
+        deadline = time.monotonic() + timeout
+
+        while os.path.exists(self._device) and time.monotonic() < gone_by:
+            time.sleep(0.1)
 
-        time.sleep(30)
+        while not os.path.exists(self._device):
+            if time.monotonic() > deadline:
+                raise ModemTimeout
+
+            time.sleep(0.5)
+
+    def _wait_for_reboot(self):
+        """wait for cu to see the modem go away, then wait for it to come back and do AT resync"""
+        log.debug("Rebooting... expect a pause")
+        log.debug("Waiting for cu to terminate")
 
-        if self._verbose:
-            print(f"[telit] Waiting for cu to terminate")
-        i = self._child.expect([pexpect.TIMEOUT, pexpect.EOF], timeout=30)
+        i = self._child.expect([pexpect.TIMEOUT, pexpect.EOF], timeout=60)
 
         if i == 0:
             raise ModemTimeout
         elif i == 1:
-            if self._verbose:
-                print(f"[telit] Restarting cu")
+            self._wait_for_device()
+
+            log.debug("Restarting cu")
 
             self._start_cu()
 
-        time.sleep(0.5)
         self.send_at_ok()
 
     def reboot(self):
         """send reboot command"""
-        if self._verbose:
-            print(f"[telit] Sending AT#REBOOT")
+        log.debug("Sending AT#REBOOT")
 
         self._child.send("AT#REBOOT\r")
         self._wait_for_reboot()
 
     def get_usb_config(self):
-        """get weird USB config value"""
-        return int(self._command_with_result("Sending", "AT#USBCFG?", r"[#]USBCFG:[ ]+([0-9]+)\r\n"))
+        """get weird USB config value, only asks the modem once per session"""
+        if self._usb_config is None:
+            self._usb_config = int(self._command_with_result("Sending", "AT#USBCFG?", self._USBCFG_RE))
+
+        return self._usb_config
 
     def set_usb_config(self, value=4):
         """set USB config.  in practice we always set it to 4"""
-        if self._verbose:
-            print(f"[telit] Sending AT#USBCFG={value}")
+        log.debug("Sending AT#USBCFG=%s", value)
 
         self._child.send(f"AT#USBCFG={value}\r")
         _ = self._wait_for_result()
+        self._usb_config = None
         self._wait_for_reboot()
 
     def get_cgdcont(self):
         """
             return a tuple having the network provider configuration
         """
-        if self._verbose:
-            print(f"[telit] Sending AT+CGDCONT?")
+        log.debug("Sending AT+CGDCONT?")
 
         self._child.send(f"AT+CGDCONT?\r")
 
-        finished = False
+        # read the whole response up to OK and then pick the rows out of it in one pass
+        self._wait_for_result()
         rc = None
 
-        while not finished:
-            i = self._child.expect([pexpect.TIMEOUT, r'[+]CGDCONT:[ ]+([0-9A-Za-z,"]+)\r\n', r"OK\r\n"])
-
-            if i == 2:
-                finished = True
-            elif i == 0:
-                if self._verbose:
-                    print(f"[telit] Timeout, failing!")
-
-                raise ModemTimeout
-            elif i == 1:
-                stuff = self._child.match[1].decode('utf-8')
+        for m in self._CGDCONT_RE.finditer(self._child.before):
+            stuff = m[1].decode('utf-8')
 
-                if self._verbose:
-                    print(f"[telit] results: {stuff}")
+            log.debug("results: %s", stuff)
 
-                stuff = stuff.split(",")
+            stuff = stuff.split(",")
 
-                if len(stuff) >= 4 and stuff[0] == "1":
-                    rc = stuff
-                    rc[1] = self._strip_quotes(rc[1])
-                    rc[2] = self._strip_quotes(rc[2])
+            if rc is None and len(stuff) >= 4 and stuff[0] == "1":
+                rc = stuff
+                rc[1] = _strip_quotes(rc[1])
+                rc[2] = _strip_quotes(rc[2])
 
         if rc is None:
             raise ECMDataError
@@ -408,24 +727,21 @@ class TelitECM(TelitGPS):
 
     def set_cgdcont(self, ip, sim_id):
         """set network provider configuration, typical values are ip="IP" and sim_id="super" """
-        if self._verbose:
-            print(f'[telit] Sending AT+CGDCONT=1,"{ip}","{sim_id}"')
+        log.debug('Sending AT+CGDCONT=1,"%s","%s"', ip, sim_id)
 
         self._child.send(f'AT+CGDCONT=1,"{ip}","{sim_id}"\r')
         _ = self._wait_for_result()
 
     def ecm_start(self):
         """bring ECM online"""
-        if self._verbose:
-            print(f"[telit] Sending AT#ECM=1,0")
+        log.debug("Sending AT#ECM=1,0")
 
         self._child.send("AT#ECM=1,0\r")
         _ = self._wait_for_result()
 
     def ecm_stop(self):
         """take ECM offline"""
-        if self._verbose:
-            print(f"[telit] Sending AT#ECMD=0")
+        log.debug("Sending AT#ECMD=0")
 
         self._child.send("AT#ECMD=0\r")
         _ = self._wait_for_result()
@@ -440,12 +756,12 @@ class TelitECM(TelitGPS):
         """
             returns list of str with ECM configuration
         """
-        stuff = self._command_with_result("Sending", "AT#ECMC?", r'[#]ECMC:[ ]+([0-9A-Za-z,."]+)\r\n')
+        stuff = self._command_with_result("Sending", "AT#ECMC?", self._ECMC_RE)
         rc = None
         stuff = stuff.split(",")
 
         if len(stuff) >= 5:
-            rc = [self._strip_quotes(v) for v in stuff]
+            rc = [_strip_quotes(v) for v in stuff]
 
         if rc is None:
             raise ECMDataError
@@ -458,54 +774,98 @@ class Telit(TelitECM):
         Telit modem interface,
         this layer has special functions
     """
+    _ICCID_RE = re.compile(rb"[+]ICCID:[ ]+([0-9]+)\r\n")
+    _IMEISV_RE = re.compile(rb"[+]IMEISV:[ ]+([0-9]+)\r\n")
+    _CSQ_RE = re.compile(rb"[+]CSQ:[ ]+([0-9]+),[0-9]+\r\n")
+    _CCLK_RE = re.compile(rb'[+]CCLK:[ ]+["]([-0-9,/:+]+)["]\r\n')
+    _INV_31 = 1 / 31.0
+    _INV_91 = 1 / 91.0
+
     def __init__(self, device, verbose=False, timeout=10):
         super().__init__(device, timeout=timeout, verbose=verbose)
 
-    @property
+    def _start_cu(self):
+        # new session (or the modem rebooted), forget the cached iccid and imei
+        self.__dict__.pop("iccid", None)
+        self.__dict__.pop("imei", None)
+        return super()._start_cu()
+
+    @functools.cached_property
     def iccid(self):
-        """Returns ICCID found on modem as an int"""
-        return int(self._command_with_result("Getting ICCID with", "AT+ICCID", r"[+]ICCID:[ ]+([0-9]+)\r\n"))
+        """Returns ICCID found on modem as a string of digits, only asks the modem once per session"""
+        return self._command_with_result("Getting ICCID with", "AT+ICCID", self._ICCID_RE)
 
     @property
+    def iccid_int(self):
+        """ICCID as an int, for anyone who still wants it that way"""
+        return int(self.iccid)
+
+    @functools.cached_property
     def imei(self):
-        """returns IMEI number found on modem as an int"""
-        rc = int(self._command_with_result("Getting IMEI with", "AT+IMEISV", r"[+]IMEISV:[ ]+([0-9]+)\r\n"))
+        """returns IMEI number found on modem as an int, only asks the modem once per session"""
+        rc = int(self._command_with_result("Getting IMEI with", "AT+IMEISV", self._IMEISV_RE))
         return rc // 100
 
     @property
     def signal_strength(self):
         """Returns signal strength as a float between 0 and 1 or None if not computed"""
         rc = int(self._command_with_result(
-            "Getting signal strength with", "AT+CSQ", r"[+]CSQ:[ ]+([0-9]+),[0-9]+\r\n"))
+            "Getting signal strength with", "AT+CSQ", self._CSQ_RE))
 
         if rc <= 31:
-            rc = float(rc / 31)
+            return rc * self._INV_31
         elif 100 <= rc <= 191:
-            rc = float((rc - 100) / 91)
-        else:
-            rc = None
+            return (rc - 100) * self._INV_91
 
-        return rc
+        return None
 
     @property
     def clock(self):
         """returns current value of RTC as datetime in whatever timezone the rtc uses"""
 
         rc = self._command_with_result(
-            "Getting clock value with", "AT+CCLK?", r'[+]CCLK:[ ]+["]([-0-9,/:+]+)["]\r\n')
+            "Getting clock value with", "AT+CCLK?", self._CCLK_RE)
 
-        zone_offset = int(rc[17:])
+        # zone offset comes in quarter hours, %z wants +HHMM
+        try:
+            minutes = int(rc[17:]) * 15
+        except ValueError:
+            raise TelitDataError(f"bad clock value '{rc}'")
 
-        if zone_offset % 4 != 0:
-            raise TelitDataError("FIXME:  handle zone_offsets that aren't a whole hour")
+        sign = "-" if minutes < 0 else "+"
+        zone = f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
 
-        tz = datetime.timezone(offset=datetime.timedelta(hours=zone_offset // 4))
-        return datetime.datetime(
-            int(rc[0:2]) + 2000, int(rc[3:5]), int(rc[6:8]), int(rc[9:11]), int(rc[12:14]), int(rc[15:17]),
-            tzinfo=tz
-        )
+        rc = datetime.datetime.strptime(rc[:17] + zone, "%y/%m/%d,%H:%M:%S%z")
+
+        # %y puts 69-99 in the 1900s, the modem's years are all 20xx
+        if rc.year < 2000:
+            rc = rc.replace(year=rc.year + 100)
+
+        return rc
 
     @property
     def utc_clock(self):
         """returns current value of RTC normalized to UTC"""
         return self.clock.astimezone(datetime.timezone(offset=datetime.timedelta(hours=0)))
+
+
+class TelitFast(Telit):
+    """
+        Telit modem interface that opens the tty itself instead of running cu under pexpect
+    """
+    def _spawn(self):
+        return SerialChild(self._device, self._bps)
+
+    def _start_cu(self):
+        # after a reboot the old tty is dead, let go of its fd and selector before opening the new one
+        if self._child is not None:
+            self._child.close()
+
+        return super()._start_cu()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._child.close()
+
+
+# set TELIT_FAST in the environment to try out TelitFast
+Modem = TelitFast if os.environ.get("TELIT_FAST") else Telit
@@ -16,45 +16,83 @@
 # TODO:  hook to external force a check of connection status
 
 import argparse
+import asyncio
 import os
+import threading
 import time
 import json
+import logging
 import pexpect
 
 import ecm
 from common.rediswrapper import RedisWrapper
-from telit import Telit, ModemError, check_for_telit
+from telit import Modem, ModemError, check_for_telit
 
-R = RedisWrapper()
+_R = None
 Device = "/dev/ttyUSB2"
 Location_src = "/boot/deepseek/location.json"
 Location_file = "/tmp/deepseek/location.json"
 Location = dict(latitude=0.0, longitude=0.0, elevation=0.0, hdop=9999.99)
 
+# one modem session for the life of the daemon, shared by the gps and ecm checks
+_modem = None
+_modem_lock = threading.Lock()
+
+# when the ecm connection was last seen working and how long to trust that for
+_ecm_state = dict(last_ok=float("-inf"), backoff=0.0)
+
+# what we last wrote to Location_file
+_last_json_bytes = None
+
+
+def R():
+    """the daemon's RedisWrapper, made on first use so importing this module doesn't connect"""
+    global _R
+
+    if _R is None:
+        _R = RedisWrapper()
+
+    return _R
+
 
 def note_location(pos, verbose):
     """stash location in Redis and in /tmp/deepseek/location.json"""
-    global Location, R
+    global Location, _last_json_bytes
 
     if pos is None:
         return
 
-    if R["HDOP"] is not None and pos["hdop"] > R["HDOP"]:
+    r = R()
+    current = r["HDOP"]
+
+    if current is not None and pos["hdop"] > current:
         return
 
-    for k in ["latitude", "longitude", "altitude", "hdop"]:
-        Location[k] = pos[k]
+    # build the new location in one go, keeping whatever else came in from location.json
+    Location = {
+        **Location,
+        "latitude": round(pos["latitude"], 4),
+        "longitude": round(pos["longitude"], 4),
+        "altitude": pos["altitude"],
+        "hdop": pos["hdop"],
+    }
+
+    r["LATITUDE"] = Location["latitude"]
+    r["LONGITUDE"] = Location["longitude"]
+    r["ALTITUDE"] = Location["altitude"]
+    r["HDOP"] = Location["hdop"]
+
+    # rounding means successive fixes often come out identical, don't rewrite the file for those
+    payload = json.dumps(Location).encode('utf-8')
 
-    Location["latitude"] = round(pos["latitude"], 4)
-    Location["longitude"] = round(pos["longitude"], 4)
+    if payload != _last_json_bytes:
+        tmp = f"{Location_file}.tmp"
 
-    R["LATITUDE"] = Location["latitude"]
-    R["LONGITUDE"] = Location["longitude"]
-    R["ALTITUDE"] = Location["altitude"]
-    R["HDOP"] = Location["hdop"]
+        with open(tmp, "wb") as f:
+            f.write(payload)
 
-    with open(Location_file, "w") as f:
-        json.dump(Location, f)
+        os.replace(tmp, Location_file)
+        _last_json_bytes = payload
 
     if verbose:
         loc = f"({Location['latitude']},{Location['longitude']})"
@@ -62,7 +100,7 @@ def note_location(pos, verbose):
         print(f"[telit_daemon:info] new location: {loc} {extra}")
 
 
-def gps_init(verbose):
+def gps_init(t, verbose):
     """get initial gps fix"""
     global Location
 
@@ -80,7 +118,7 @@ def gps_init(verbose):
         note_location(Location, verbose)
 
     # get first gps fix
-    with Telit(Device, verbose) as t:
+    with _modem_lock:
         t.send_at_ok()
         t.send_gpsp_on()
 
@@ -88,7 +126,7 @@ def gps_init(verbose):
 
         try:
             while pos is None:
-                pos = t.get_position(2.0)
+                pos = t.watch_position(2.0, seconds=300)
 
         except ModemError as e:
             print(f"[telit_daemon:error] Error:  {e}")
@@ -97,37 +135,98 @@ def gps_init(verbose):
         t.send_gpsp_off()
 
 
-def gps_check(verbose):
+def gps_check(t, verbose):
     """periodically check for better gps fix"""
     global Location
 
     # periodically check for a better gps fix
-    with Telit(Device, verbose) as t:
+    with _modem_lock:
         t.send_at_ok()
-        t.send_gpsp_on()
 
-        pos = t.get_position(2.0, total=2)
+        pos = t.watch_position(2.0, seconds=20, power=True)
         note_location(pos, verbose)
 
-        t.send_gpsp_off()
 
+def ecm_check(t, host, verbose, interval):
+    """
+    checks if ECM is up and restore if it isn't
 
-def ecm_check(host, verbose):
-    """checks if ECM is up and restore if it isn't"""
+    each good check doubles how long we trust it (from interval up to 8 * interval) before
+    checking again, a failed check goes back to checking every time
+    """
+    now = time.monotonic()
+
+    if now - _ecm_state["last_ok"] < _ecm_state["backoff"]:
+        return
 
     if ecm.check_connection(host):
+        _ecm_state["last_ok"] = now
+        _ecm_state["backoff"] = min(max(_ecm_state["backoff"] * 2, interval), interval * 8)
         return
 
+    _ecm_state["backoff"] = 0.0
+
     if verbose:
         print(f"[telit_daemon:info] ECM connection down, restarting connection")
 
-    with Telit(Device, verbose) as t:
+    with _modem_lock:
         t.send_at_ok()
         t.ecm_start()
 
 
+def reopen_modem(t, verbose):
+    """cu (or the modem under it) went away, throw the session out and start a new one"""
+    global _modem
+
+    with _modem_lock:
+        # the other check may have lost the same session and already replaced it
+        if _modem is not t:
+            return
+
+        try:
+            _modem.__exit__(None, None, None)
+        except (OSError, pexpect.exceptions.ExceptionPexpect):
+            pass
+
+        _modem = Modem(Device, verbose).__enter__()
+
+
+async def _every(interval, verbose, check, *args):
+    """run a blocking check on the default thread pool every interval seconds"""
+    loop = asyncio.get_running_loop()
+
+    while True:
+        if verbose:
+            print(f"[telit_daemon:info] Time check ({check.__name__}): {time.asctime()}")
+
+        t = _modem
+
+        try:
+            await loop.run_in_executor(None, check, t, *args)
+        except ModemError as e:
+            print(f"[telit_daemon:error] Error:  {e}")
+        except (pexpect.exceptions.EOF, OSError) as e:
+            print(f"[telit_daemon:error] lost the modem: {e}")
+
+            # if the device hasn't come back yet keep the dead session, the next check will try again
+            try:
+                await loop.run_in_executor(None, reopen_modem, t, verbose)
+            except (OSError, ModemError, pexpect.exceptions.ExceptionPexpect) as e:
+                print(f"[telit_daemon:error] could not reopen {Device}: {e}")
+
+        await asyncio.sleep(interval)
+
+
+async def _amain(args):
+    # the ecm ping doesn't need the modem so it can run while gps_check has it
+    await asyncio.gather(
+        _every(args.check, args.verbose, ecm_check, args.host, args.verbose, args.check),
+        _every(args.check, args.verbose, gps_check, args.verbose),
+    )
+
+
 def main():
-    global Device
+    global Device, _modem
 
     ap = argparse.ArgumentParser()
     ap.add_argument("--verbose", action="store_true", default=False)
@@ -136,6 +235,7 @@ def main():
     ap.add_argument("--host", type=str, default="sixfab.com")
 
     args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="[%(name)s] %(message)s")
     Device = args.device
 
     if not check_for_telit():
@@ -148,22 +248,16 @@ def main():
         print(f"[telit_daemon:error] no device {Device}")
         exit(0)
 
-    gps_init(args.verbose)
-    ecm.verbose = args.verbose
+    _modem = Modem(Device, args.verbose).__enter__()
 
-    while True:
-        if args.verbose:
-            print(f"[telit_daemon:info] Time check: {time.asctime()}")
+    try:
+        gps_init(_modem, args.verbose)
+        ecm.verbose = args.verbose
 
-        try:
-            ecm_check(args.host, args.verbose)
-            gps_check(args.verbose)
-        except ModemError as e:
-            print(f"[telit_daemon:error] Error:  {e}")
-        except pexpect.exceptions.EOF as e:
-            print(f"[telit_daemon:error] pexpect EOF error: {e}")
+        asyncio.run(_amain(args))
 
-        time.sleep(args.check)
+    finally:
+        _modem.__exit__(None, None, None)
 
 
 if __name__ == "__main__":